@@ -1,6 +1,8 @@
 """
 Global Configuration for the Benchmark Suite.
 """
+import socket
+from urllib.parse import urlparse
 
 # Stack/Namespace name (used for both Swarm and K8s legacy compatibility)
 STACK_NAME = "cob-service"
@@ -12,4 +14,16 @@ SERVICE_NAME = "backend"
 #API_URL = "http://192.168.15.9/api"
 
 # Nomad
-API_URL = "http://192.168.15.9/api"
\ No newline at end of file
+API_URL = "http://192.168.15.9/api"
+
+# --- Pre-resolved API endpoint ---
+# getaddrinfo can block for tens of ms under load and runs on every new
+# connection. Resolve the hostname once at import time: probe loops
+# connect straight to the IP and pass the original name via Host header.
+_parsed = urlparse(API_URL)
+try:
+    _ip = socket.gethostbyname(_parsed.hostname)
+    API_URL_RESOLVED = API_URL.replace(_parsed.hostname, _ip, 1)
+except socket.gaierror:
+    API_URL_RESOLVED = API_URL
+API_HEADERS = {"Host": _parsed.hostname}
\ No newline at end of file
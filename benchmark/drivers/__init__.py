@@ -0,0 +1,17 @@
+from .swarm_driver import SwarmDriver
+from .k8s_driver import K8sDriver
+from .nomad_driver import NomadDriver
+
+DRIVERS = {
+    "swarm": SwarmDriver,
+    "k8s": K8sDriver,
+    "nomad": NomadDriver,
+}
+
+
+def get_driver(name):
+    """Instantiates the orchestrator driver for `name` (swarm/k8s/nomad)."""
+    try:
+        return DRIVERS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown driver '{name}' (choose from {sorted(DRIVERS)})")
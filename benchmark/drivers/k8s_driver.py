@@ -1,4 +1,5 @@
 import subprocess
+import select
 import time
 import json
 import sys
@@ -40,6 +41,47 @@ class K8sDriver:
         except Exception as e:
             print(f"[ERROR] Error parsing JSON: {e}")
 
+    def watch_replicas(self, service_name, target, timeout=120):
+        """
+        Blocks until the deployment reports `target` ready replicas.
+        One long-lived `kubectl get -w` subprocess streams the status
+        transitions, so we wake on the actual event instead of paying a
+        fork-exec per poll. Returns True on convergence, False on timeout.
+        """
+        print(f"[K8S-DRIVER] Watching {service_name} until {target} replicas ready...")
+        cmd = [
+            "kubectl", "get", "deployment", service_name,
+            "-n", self.namespace, "-w",
+            "-o", "jsonpath={.status.readyReplicas}{\"\\n\"}"
+        ]
+        proc = subprocess.Popen(cmd, stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL)
+        deadline = time.time() + timeout
+        buf = b""
+        try:
+            while time.time() < deadline:
+                # select so a silent watch can't block us past the deadline
+                ready_fds, _, _ = select.select([proc.stdout], [], [], deadline - time.time())
+                if not ready_fds:
+                    break
+                # read1 + manual line split: readline() would leave extra
+                # lines in the buffered reader where select can't see them
+                chunk = proc.stdout.read1(4096)
+                if not chunk:
+                    break  # watch died (kubectl error)
+                *lines, buf = (buf + chunk).split(b"\n")
+                for raw in lines:
+                    try:
+                        ready = int(raw.strip() or 0)
+                    except ValueError:
+                        continue
+                    if ready >= target:
+                        return True
+        finally:
+            proc.terminate()
+            proc.wait()
+        return False
+
     def get_worker_nodes(self):
         """Return nodes list"""
         cmd = "kubectl get nodes -o jsonpath='{.items[*].status.addresses[?(@.type==\"InternalIP\")].address}'"
@@ -122,6 +164,13 @@ class K8sDriver:
         res = self._run(cmd)
         return res.stdout.strip()
 
+    def get_node_ip(self, node_name):
+        """Returns the InternalIP of a node"""
+        cmd = (f"kubectl get node {node_name} "
+               f"-o jsonpath='{{.status.addresses[?(@.type==\"InternalIP\")].address}}'")
+        res = self._run(cmd)
+        return res.stdout.strip()
+
     def cordon_node(self, node_name):
         """Marks the node as unschedulable"""
         print(f"[K8S-DRIVER] Cordoning node {node_name}...")
@@ -152,10 +201,14 @@ class K8sDriver:
         self._run(f"kubectl delete deployment {service_name} -n {self.namespace}")
 
     def count_running_tasks(self, service_name):
-        # Conta solo i pod che sono effettivamente RUNNING
-        cmd = f"kubectl get pods -n {self.namespace} -l app={service_name} --field-selector=status.phase=Running --no-headers | wc -l"
+        # Conta solo i pod che sono effettivamente RUNNING.
+        # Output JSON strutturato invece del pipe testuale a wc -l
+        cmd = (f"kubectl get pods -n {self.namespace} -l app={service_name} "
+               f"--field-selector=status.phase=Running -o json")
         res = self._run(cmd)
+        if res.returncode != 0:
+            return 0
         try:
-            return int(res.stdout.strip())
-        except:
+            return len(json.loads(res.stdout).get("items", []))
+        except Exception:
             return 0
\ No newline at end of file
@@ -4,6 +4,8 @@ import time
 import os
 import textwrap
 
+import requests
+
 
 class NomadDriver:
     """
@@ -267,6 +269,53 @@ class NomadDriver:
             if os.path.exists(filename):
                 os.remove(filename)
 
+    def prewarm_image(self, image="alpine:latest"):
+        """
+        Pre-pulls the image on EVERY node with a 'system' type job (one
+        allocation per node, guaranteed), instead of the 'N replicas =
+        one per node' heuristic that the scheduler may pack onto fewer
+        nodes. Returns the job name so the caller can purge it.
+        """
+        job_name = "benchmark-prewarm"
+        print(f"[NOMAD-DRIVER] Prewarming image {image} on all nodes...")
+
+        job_hcl = textwrap.dedent(f"""
+        job "{job_name}" {{
+          datacenters = ["dc1"]
+          type        = "system"
+
+          group "prewarm-group" {{
+            task "pull" {{
+              driver = "docker"
+
+              config {{
+                image   = "{image}"
+                command = "true"
+              }}
+
+              resources {{
+                cpu    = 20
+                memory = 20
+              }}
+            }}
+          }}
+        }}
+        """)
+
+        filename = f"/tmp/{job_name}.nomad"
+        try:
+            with open(filename, "w") as f:
+                f.write(job_hcl)
+
+            res = self._run(f"nomad job run {filename}")
+            if res.returncode != 0:
+                print(f"[ERROR] Failed to submit prewarm job: {res.stderr}")
+        finally:
+            if os.path.exists(filename):
+                os.remove(filename)
+
+        return job_name
+
     def remove_service(self, service_name):
         """
         Stops and Purges a job completely.
@@ -307,6 +356,62 @@ class NomadDriver:
         except Exception as e:
             return 0
 
+    def wait_for_running_allocations(self, job_name, target, timeout=120):
+        """
+        Blocks until `target` allocations of the job are running.
+        Consumes the Nomad event stream (topic Allocation) over HTTP so
+        we wake on the actual transitions instead of forking the CLI
+        every 100ms; falls back to polling if the stream is unreachable.
+        Returns the number of distinct running allocations observed.
+        """
+        nomad_addr = os.environ.get("NOMAD_ADDR", "http://127.0.0.1:4646")
+        url = f"{nomad_addr}/v1/event/stream"
+        deadline = time.time() + timeout
+        running = set()
+
+        try:
+            # Read timeout corto (10s): se lo stream tace troppo a lungo
+            # (o ci siamo persi la transizione finale perché avvenuta
+            # prima della sottoscrizione) degradiamo al polling sotto
+            # invece di restare appesi fino alla deadline piena.
+            with requests.get(url, params={"topic": f"Allocation:{job_name}"},
+                              stream=True, timeout=(5, 10)) as resp:
+                resp.raise_for_status()
+
+                # Controllo iniziale DOPO la sottoscrizione: allocazioni
+                # già running non emetteranno nuovi eventi
+                count = self.count_running_tasks(job_name)
+                if count >= target:
+                    return count
+
+                # chunk_size=1: senza, iter_lines bufferizza 512 byte e
+                # consegna gli eventi in ritardo
+                for line in resp.iter_lines(chunk_size=1):
+                    if time.time() > deadline:
+                        break
+                    if not line:
+                        continue  # stream heartbeat
+                    try:
+                        payload = json.loads(line)
+                    except ValueError:
+                        continue
+                    for event in payload.get("Events", []):
+                        alloc = event.get("Payload", {}).get("Allocation", {})
+                        if alloc.get("JobID") == job_name and alloc.get("ClientStatus") == "running":
+                            running.add(alloc.get("ID"))
+                    if len(running) >= target:
+                        return len(running)
+        except Exception as e:
+            print(f"[NOMAD-DRIVER] Event stream unavailable ({e}), falling back to polling...")
+            while time.time() < deadline:
+                count = self.count_running_tasks(job_name)
+                if count >= target:
+                    return count
+                time.sleep(0.5)
+            return self.count_running_tasks(job_name)
+
+        return len(running)
+
     def reset_cluster(self):
         """
         Resets the main service to a known baseline (2 backend, 2 frontend).
@@ -1,14 +1,46 @@
 import subprocess
 import time
+import docker
+import orjson
 import psutil
 
 class SwarmDriver:
     def __init__(self, stack_name="cob-service"):
         self.stack_name = stack_name
+        self._cache = {}
+        self._api = None
+
+    @property
+    def api(self):
+        """
+        Connessione persistente (lazy) al socket locale del demone.
+        Una chiamata HTTP su /var/run/docker.sock costa una frazione del
+        fork+exec della CLI, fondamentale nei poll loop stretti.
+        """
+        if self._api is None:
+            self._api = docker.APIClient(base_url='unix:///var/run/docker.sock')
+        return self._api
 
     def _run(self, cmd):
         return subprocess.run(cmd, shell=True, capture_output=True, text=True)
 
+    def _run_cached(self, cmd, ttl=0.25):
+        """
+        Come _run, ma memoizza il risultato per un tick di `ttl` secondi:
+        query ravvicinate nello stesso giro di polling riusano lo stesso
+        fork invece di rilanciare la CLI (~50-200ms a chiamata).
+        """
+        tick = int(time.monotonic() / ttl)
+        key = (cmd, tick)
+        if key not in self._cache:
+            # sfratta solo le entry di tick passati (il polling non torna
+            # indietro): comandi DIVERSI dello stesso tick restano in
+            # cache, che è esattamente il caso back-to-back da collassare
+            for stale in [k for k in self._cache if k[1] != tick]:
+                del self._cache[stale]
+            self._cache[key] = self._run(cmd)
+        return self._cache[key]
+
     def _ssh_exec(self, node, cmd):
         ssh_cmd = f"ssh -o StrictHostKeyChecking=no {node} '{cmd}'"
         print(f"[DRIVER-SSH] Executing on {node}: {cmd}")
@@ -19,19 +51,65 @@ class SwarmDriver:
         print(f"[DRIVER] Scaling {full_name} to {replicas}..")
         self._run(f"docker service scale {full_name}={replicas}")
 
-    def get_replica_count(self, service_short_name):
+    def get_replica_count(self, service_short_name, fresh=False):
         full_name = f"{self.stack_name}_{service_short_name}"
-        res = self._run(f"docker service ls --filter name={full_name} --format ''{{{{.Replicas}}}}''")
+        # Output JSON strutturato: niente parsing fragile del template testuale.
+        # fresh=True salta la cache TTL (serve nei loop event-driven dove
+        # un risultato vecchio di 250ms può nascondere l'ultima transizione)
+        cmd = f"docker service ls --filter name={full_name} --format '{{{{json .}}}}'"
+        res = self._run(cmd) if fresh else self._run_cached(cmd)
         try:
             # Se output è vuoto o malformato ritorna 0,0
             line = res.stdout.strip()
-            if "/" in line:
-                current, desired = line.split("/")
+            if not line:
+                return 0, 0
+            replicas = orjson.loads(line.splitlines()[0]).get("Replicas", "")
+            if "/" in replicas:
+                current, desired = replicas.split("/")
                 return int(current), int(desired)
             return 0, 0
         except Exception as e:
             return 0, 0
 
+    def wait_for_convergence(self, service_short_name, target, timeout=120):
+        """
+        Blocca finché il servizio non ha `target` task running.
+        Ascolta lo stream di eventi del demone Docker filtrato sul
+        servizio: ci svegliamo sulle transizioni dei container invece di
+        forkare 'docker service ls' ogni 2 secondi.
+        Returns True on convergence, False on timeout.
+        """
+        full_name = f"{self.stack_name}_{service_short_name}"
+        print(f"[DRIVER] Waiting for {full_name} to reach {target} running tasks...")
+
+        deadline = time.time() + timeout
+        client = docker.from_env()
+
+        # Il demone locale emette eventi container solo per i task che
+        # girano QUI: su un manager drenato (o con i task sui worker)
+        # lo stream resta muto anche a servizio convergente. Quindi:
+        # finestre di eventi da ~2s chiuse da 'until', con un controllo
+        # fresco dello stato all'inizio di ogni finestra - reattivi agli
+        # eventi locali, ma mai peggio di un poll da 2s.
+        while time.time() < deadline:
+            current, desired = self.get_replica_count(service_short_name, fresh=True)
+            if current == target and desired == target:
+                return True
+
+            window_end = min(time.time() + 2, deadline)
+            events = client.events(decode=True, until=int(window_end) + 1,
+                                   filters={"type": "container", "service": full_name})
+            try:
+                for _ in events:
+                    current, desired = self.get_replica_count(service_short_name, fresh=True)
+                    if current == target and desired == target:
+                        return True
+                    if time.time() > window_end:
+                        break
+            finally:
+                events.close()
+        return False
+
     def get_worker_nodes(self):
         res = self._run("docker node ls --format '{{.Hostname}}' --filter role=worker")
         return res.stdout.strip().split('\n')
@@ -87,6 +165,19 @@ class SwarmDriver:
         cmd = f"docker service create --name {service_name} --replicas {replicas} alpine:latest sleep infinity"
         self._run(cmd)
 
+    def prewarm_image(self, image="alpine:latest"):
+        """
+        Pre-scarica l'immagine su TUTTI i nodi con un servizio in modalità
+        global (un task per nodo garantito), invece dell'euristica
+        'N repliche = una per nodo'. Ritorna il nome del servizio.
+        """
+        service_name = "benchmark-prewarm"
+        print(f"[DRIVER] Prewarming image {image} on all nodes...")
+        cmd = (f"docker service create --name {service_name} --mode global "
+               f"--restart-condition none {image} true")
+        self._run(cmd)
+        return service_name
+
     def remove_service(self, service_name):
         print(f"[DRIVER] Removing service {service_name}...")
         self._run(f"docker service rm {service_name}")
@@ -94,18 +185,25 @@ class SwarmDriver:
     def count_running_tasks(self, service_name):
         """
         Conta quanti task sono EFFETTIVAMENTE in stato 'Running'.
-        Non si fida di 'docker service ls', guarda i singoli processi.
+        Non si fida di 'docker service ls', guarda i singoli task
+        via API socket (niente fork della CLI per ogni poll).
         """
-        cmd = f"docker service ls --filter name={service_name} --format '{{{{.Replicas}}}}'"
-        res = self._run(cmd)
         try:
-            line = res.stdout.strip()
-            if "/" in line:
-                current, desired = line.split("/")
-                return int(current)
-            return 0
-        except:
-            return 0
+            tasks = self.api.tasks(filters={'service': service_name,
+                                            'desired-state': 'running'})
+            return sum(1 for t in tasks if t['Status']['State'] == 'running')
+        except Exception:
+            # Fallback CLI se il socket non è raggiungibile
+            cmd = f"docker service ls --filter name={service_name} --format '{{{{.Replicas}}}}'"
+            res = self._run_cached(cmd)
+            try:
+                line = res.stdout.strip()
+                if "/" in line:
+                    current, desired = line.split("/")
+                    return int(current)
+                return 0
+            except:
+                return 0
 
     def reset_cluster(self, service_to_reset=["backend.yaml", "frontend"]):
         print("\n[DRIVER] --- RESETTING CLUSTER ---")
@@ -115,19 +213,19 @@ class SwarmDriver:
             self._run(f"docker service scale {full_name}=0")
 
         print("[DRIVER] Waiting for containers to terminate...")
-        max_retries = 30
-        for _ in range(max_retries):
-            still_alive = False
+        # Backoff esponenziale (0.1s -> 2s): i teardown rapidi escono in
+        # meno di un secondo, quelli lunghi non martellano il manager
+        deadline = time.time() + 60
+        delay = 0.1
+        while time.time() < deadline:
             # Controlliamo se ci sono task in running state per lo stack
             # Questo comando lista tutti i processi dello stack che non sono Shutdown
             cmd = f"docker stack ps {self.stack_name} --filter desired-state=running --format '{{{{.ID}}}}'"
             res = self._run(cmd)
-            if res.stdout.strip():
-                still_alive = True
-
-            if not still_alive:
+            if not res.stdout.strip():
                 break
-            time.sleep(2)
+            time.sleep(delay)
+            delay = min(delay * 2, 2.0)
 
         print("[DRIVER] Cluster clean. Cooling down (5s)...")
         time.sleep(5)
@@ -135,9 +233,28 @@ class SwarmDriver:
 
     def get_db_node(self):
         """Trova su quale nodo sta girando il DB"""
-        cmd = "docker service ps cob-service_db --filter desired-state=running --format '{{.Node}}'"
-        res = self._run(cmd)
-        return res.stdout.strip()
+        try:
+            tasks = self.api.tasks(filters={'service': f'{self.stack_name}_db',
+                                            'desired-state': 'running'})
+            if not tasks:
+                return ""
+            # Risolviamo il NodeID in hostname come faceva la CLI
+            node = self.api.inspect_node(tasks[0]['NodeID'])
+            return node['Description']['Hostname']
+        except Exception:
+            # Fallback CLI se il socket non è raggiungibile: una sola
+            # chiamata con output JSON strutturato, niente pipeline di
+            # template testuali
+            cmd = (f"docker service ps {self.stack_name}_db "
+                   f"--filter desired-state=running --format '{{{{json .}}}}'")
+            res = self._run_cached(cmd)
+            lines = res.stdout.strip().splitlines()
+            if not lines:
+                return ""
+            try:
+                return orjson.loads(lines[0]).get("Node", "")
+            except Exception:
+                return ""
 
     def get_dockerd_stats(self, process_name="dockerd"):
         for proc in psutil.process_iter(['pid', 'name']):
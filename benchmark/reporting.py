@@ -0,0 +1,20 @@
+"""
+Shared helpers for persisting benchmark results.
+"""
+import os
+
+import orjson
+
+
+def save_json(path, payload):
+    """
+    Writes `payload` to `path` as indented JSON.
+
+    orjson encodes in native code, and the write goes through a temp
+    file + os.replace so a killed test can't leave behind a half-written
+    result file.
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(orjson.dumps(payload, option=orjson.OPT_INDENT_2))
+    os.replace(tmp_path, path)
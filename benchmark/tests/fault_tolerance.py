@@ -1,10 +1,13 @@
+import asyncio
 import time
-import requests
+import urllib3
 import threading
 import sys
 import os
-import json
 import csv
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
 
 # --- Setup Paths ---
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -13,6 +16,7 @@ sys.path.append(parent_dir)
 
 # --- Local Imports ---
 import config
+from reporting import save_json
 #from drivers.swarm_driver import SwarmDriver
 from drivers.k8s_driver import K8sDriver
 from drivers.nomad_driver import NomadDriver
@@ -22,43 +26,74 @@ TEST_DURATION = 90      # Duration of monitoring after the kill (seconds)
 POLLING_INTERVAL = 0.1  # Request frequency (10 req/s for high precision RTO)
 REPLICAS = 6            # High replica count to ensure spread across nodes
 
+# Resolved once: the probe loop should not re-read config on every
+# request, and the pre-resolved IP skips the per-connection DNS lookup
+ASSIGNMENTS_URL = f"{config.API_URL_RESOLVED}/assignments"
+
 # Globals
 stop_traffic = False
 traffic_log = []
 
 def traffic_generator():
     """
-    Generates sequential traffic to measure availability.
+    Generates traffic at a FIXED cadence to measure availability.
     Logs every request to calculate RTO (Recovery Time Objective).
+
+    Probes are dispatched to a small thread pool from an asyncio ticker:
+    a slow (or timing-out) request never delays the next sample, so the
+    sampling rate stays at 1/POLLING_INTERVAL even when the cluster is
+    degraded - which is exactly the moment we care about.
     """
     global stop_traffic, traffic_log
     print("[TRAFFIC] Generator started...")
 
-    s = requests.Session()
-    # We disable keep-alive to test fresh routing for every request,
-    # ensuring we hit the load balancer logic properly.
-    s.keep_alive = False
+    # urllib3 skips the Request->PreparedRequest->Response churn of
+    # `requests`; the probes need neither cookies nor redirects.
+    pool = urllib3.PoolManager(num_pools=1, maxsize=32)
 
-    base_url = config.API_URL
+    # Connection: close keeps the original no-keep-alive behavior, so
+    # every probe exercises the load balancer routing afresh
+    headers = dict(config.API_HEADERS, Connection="close")
 
-    while not stop_traffic:
+    def probe():
+        # wall clock only for the log timestamp (aligned with kill_time);
+        # the latency uses the monotonic ns counter so NTP steps can't
+        # produce negative or skewed samples
         ts = time.time()
+        t0 = time.perf_counter_ns()
         status = 0
         error_msg = ""
         try:
             # Very short timeout: if a node is dead, we want to fail fast
-            resp = s.get(f"{base_url}/assignments", timeout=0.5)
-            status = resp.status_code
+            resp = pool.request("GET", ASSIGNMENTS_URL, headers=headers,
+                                timeout=0.5, retries=False)
+            status = resp.status
         except Exception as e:
             status = -1  # Connection Error / Timeout
             error_msg = str(e)
 
+        # list.append is atomic, safe from worker threads
         traffic_log.append({
             "timestamp": ts,
+            "latency": (time.perf_counter_ns() - t0) / 1e9,
             "status": status,
             "error": error_msg
         })
-        time.sleep(POLLING_INTERVAL)
+
+    async def ticker():
+        loop = asyncio.get_running_loop()
+        # Enough workers to absorb a burst of 0.5s timeouts without
+        # stalling the cadence (0.5s / 0.1s interval = 5 in-flight worst case)
+        pool = ThreadPoolExecutor(max_workers=20)
+        next_t = loop.time()
+        while not stop_traffic:
+            loop.run_in_executor(pool, probe)
+            next_t += POLLING_INTERVAL
+            await asyncio.sleep(max(0.0, next_t - loop.time()))
+        # Wait for in-flight probes before handing back to the analysis
+        pool.shutdown(wait=True)
+
+    asyncio.run(ticker())
 
 def test_fault_tolerance():
     global stop_traffic
@@ -138,13 +173,35 @@ def test_fault_tolerance():
     # CLEANUP REMINDER
     print(f"\n[IMPORTANT] Test finished. Remember to START node {victim} again in Proxmox!")
 
-    # save raw data
+    # save raw data in the background while the analysis below runs
     csv_path = "results/fault_tolerance_log_nomad.csv"
     os.makedirs("results", exist_ok=True)
-    with open(csv_path, "w", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=["timestamp", "status", "error"])
-        writer.writeheader()
-        writer.writerows(traffic_log)
+
+    def write_traffic_csv():
+        with open(csv_path, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=["timestamp", "latency", "status", "error"])
+            writer.writeheader()
+            writer.writerows(traffic_log)
+
+    io_pool = ThreadPoolExecutor(max_workers=1)
+    csv_future = io_pool.submit(write_traffic_csv)
+
+    # Latency statistics (successful probes only)
+    # np.percentile does the whole pass in C instead of sorting in Python
+    latencies = np.fromiter(
+        (x['latency'] for x in traffic_log if x['status'] == 200),
+        dtype=np.float64
+    )
+    if latencies.size > 0:
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        output["latency_ms"] = {
+            "avg": round(float(latencies.mean()) * 1000, 2),
+            "p50": round(float(p50) * 1000, 2),
+            "p95": round(float(p95) * 1000, 2),
+            "p99": round(float(p99) * 1000, 2)
+        }
+        print(f"[TEST] Probe latency: avg {output['latency_ms']['avg']}ms | "
+              f"p95 {output['latency_ms']['p95']}ms | p99 {output['latency_ms']['p99']}ms")
 
     # Calculate RTO
     # We look for the first failure AFTER the kill confirmation
@@ -157,8 +214,12 @@ def test_fault_tolerance():
         print("   2. You killed a node that had no active traffic at that specific millisecond.")
         rto = 0
     else:
-        first_fail_ts = failures_after_kill[0]['timestamp']
-        last_fail_ts = failures_after_kill[-1]['timestamp']
+        # The concurrent probes don't append in timestamp order (a
+        # timing-out probe lands up to 0.5s after faster later ones),
+        # so take min/max instead of trusting list position
+        fail_ts = [x['timestamp'] for x in failures_after_kill]
+        first_fail_ts = min(fail_ts)
+        last_fail_ts = max(fail_ts)
 
         # RTO = Time between first error and last error
         rto = last_fail_ts - first_fail_ts
@@ -180,8 +241,11 @@ def test_fault_tolerance():
 
     # Save JSON
     outfile = "results/fault_tolerance_nomad.json"
-    with open(outfile, "w") as f:
-        json.dump(output, f, indent=2)
+    save_json(outfile, output)
+
+    # Surface any CSV write error before exiting
+    csv_future.result()
+    io_pool.shutdown(wait=True)
 
 
 if __name__ == "__main__":
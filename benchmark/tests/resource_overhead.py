@@ -1,7 +1,7 @@
+import random
 import time
 import sys
 import os
-import json
 import psutil
 import statistics
 
@@ -12,6 +12,7 @@ sys.path.append(parent_dir)
 
 # Local imports
 import config
+from reporting import save_json
 from drivers.nomad_driver import NomadDriver  # <--- USIAMO NOMAD
 
 # Il processo da monitorare. In Nomad è un unico binario "nomad".
@@ -110,23 +111,29 @@ def test_resource_overhead():
 
         if count > 0:
             print(f"[TEST] Waiting for convergence...")
-            waited = 0
-            # Attesa attiva che i task siano Running
-            while waited < 120:
+            # Attesa attiva che i task siano Running.
+            # Backoff esponenziale con jitter invece di un poll fisso da 2s
+            start_wait = time.time()
+            delay = 0.2
+            last_curr = -1
+            while True:
                 curr, des = driver.get_replica_count(service_to_scale)
 
-                # Feedback visivo
-                sys.stdout.write(f"\r   Status: {curr}/{count} running...")
-                sys.stdout.flush()
+                # Feedback visivo solo al cambio di stato
+                if curr != last_curr:
+                    sys.stdout.write(f"\r   Status: {curr}/{count} running...")
+                    sys.stdout.flush()
+                    last_curr = curr
 
                 if curr >= count:
                     print("")  # Newline
                     break
-                time.sleep(2)
-                waited += 2
 
-            if waited >= 120:
-                print("\n[WARNING] Timeout waiting for replicas (proceeding anyway)")
+                if time.time() - start_wait >= 120:
+                    print("\n[WARNING] Timeout waiting for replicas (proceeding anyway)")
+                    break
+                time.sleep(delay * random.uniform(0.9, 1.1))
+                delay = min(delay * 1.5, 2.0)
 
             print(f"[TEST] {curr} tasks running.")
             print("[TEST] Stabilizing (15s)...")
@@ -159,8 +166,7 @@ def test_resource_overhead():
     # Save Results
     os.makedirs("results", exist_ok=True)
     outfile = "results/resource_overhead_nomad.json"
-    with open(outfile, "w") as f:
-        json.dump(output, f, indent=2)
+    save_json(outfile, output)
     print(f"\n[TEST] Completed. JSON saved to {outfile}")
 
 
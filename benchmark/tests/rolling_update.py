@@ -1,11 +1,16 @@
+import collections
+import random
 import time
 import requests
+import urllib3
 import threading
 import sys
 import os
-import json
 import csv
 
+import numpy as np
+import pandas as pd
+
 # --- Setup Paths ---
 current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)
@@ -13,49 +18,74 @@ sys.path.append(parent_dir)
 
 # --- Local Imports ---
 import config
+from reporting import save_json
 #from drivers.swarm_driver import SwarmDriver
 #from drivers.k8s_driver import K8sDriver
 from drivers.nomad_driver import NomadDriver
 
 # --- Constants & Globals ---
 STOP_TRAFFIC = False
-TRAFFIC_LOG = []
+CSV_PATH = "results/rolling_update_log_nomad.csv"
+FLUSH_EVERY = 500  # Samples buffered in memory before a batch write
 POLLING_INTERVAL = 0.1  # Seconds between requests
 HTTP_TIMEOUT = 1  # Timeout for individual requests
 UPDATE_WINDOW = 45  # Time to monitor during the update
 REPLICAS = 3
 
+# Resolved once: the traffic loop should not re-read config on every
+# request, and the pre-resolved IP skips the per-connection DNS lookup
+ASSIGNMENTS_URL = f"{config.API_URL_RESOLVED}/assignments"
+
 
 def traffic_generator():
     """
     Generates constant traffic to detect service gaps during updates.
-    Logs every request to TRAFFIC_LOG.
+
+    Samples are buffered in a deque and flushed to the CSV log every
+    FLUSH_EVERY entries, so memory stays bounded even at high polling
+    rates; the analysis re-streams the file once the run is over.
     """
-    global STOP_TRAFFIC, TRAFFIC_LOG
+    global STOP_TRAFFIC
     print("[TRAFFIC] Generator started...")
 
-    s = requests.Session()
+    # We test the specific endpoint to ensure backend connectivity.
+    # urllib3 skips the Request->PreparedRequest->Response churn of
+    # `requests`; this loop needs neither cookies nor redirects.
+    pool = urllib3.PoolManager(num_pools=1, maxsize=4)
 
-    # We test the specific endpoint to ensure backend connectivity
-    base_url = config.API_URL
+    os.makedirs("results", exist_ok=True)
+    buf = collections.deque()
 
-    while not STOP_TRAFFIC:
-        ts = time.time()
-        status = 0
-        error_msg = ""
-        try:
-            resp = s.get(f"{base_url}/assignments", timeout=HTTP_TIMEOUT)
-            status = resp.status_code
-        except Exception as e:
-            status = -1  # Connection error or timeout
-            error_msg = str(e)
+    with open(CSV_PATH, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=["timestamp", "status", "error"])
+        writer.writeheader()
 
-        TRAFFIC_LOG.append({
-            "timestamp": ts,
-            "status": status,
-            "error": error_msg
-        })
-        time.sleep(POLLING_INTERVAL)
+        while not STOP_TRAFFIC:
+            ts = time.time()
+            status = 0
+            error_msg = ""
+            try:
+                resp = pool.request("GET", ASSIGNMENTS_URL, headers=config.API_HEADERS,
+                                    timeout=HTTP_TIMEOUT, retries=False)
+                status = resp.status
+            except Exception as e:
+                status = -1  # Connection error or timeout
+                error_msg = str(e)
+
+            buf.append({
+                "timestamp": ts,
+                "status": status,
+                "error": error_msg
+            })
+            if len(buf) >= FLUSH_EVERY:
+                writer.writerows(buf)
+                f.flush()
+                buf.clear()
+
+            time.sleep(POLLING_INTERVAL)
+
+        # Flush the tail before the analysis re-reads the file
+        writer.writerows(buf)
 
 
 def wait_for_http_ready(url, timeout=60):
@@ -66,7 +96,7 @@ def wait_for_http_ready(url, timeout=60):
     start = time.time()
     while time.time() - start < timeout:
         try:
-            if requests.get(url, timeout=HTTP_TIMEOUT).status_code == 200:
+            if requests.get(url, timeout=HTTP_TIMEOUT, headers=config.API_HEADERS).status_code == 200:
                 print("[TEST] Service is READY!")
                 return True
         except:
@@ -103,9 +133,11 @@ def test_rolling_update():
 
     print(f"[TEST] Waiting for infrastructure ({REPLICAS} replicas)...")
 
-    # Wait for K8s convergence
+    # Wait for convergence.
+    # Exponential backoff with jitter instead of a flat 2s poll
     max_wait = 120
     start_wait = time.time()
+    delay = 0.2
     while True:
         curr, des = driver.get_replica_count(service_name)
         if curr == REPLICAS and des == REPLICAS:
@@ -113,14 +145,14 @@ def test_rolling_update():
         if time.time() - start_wait > max_wait:
             print("[CRITICAL] Timeout waiting for replicas.")
             return
-        time.sleep(2)
+        time.sleep(delay * random.uniform(0.9, 1.1))
+        delay = min(delay * 1.5, 2.0)
 
     # Extra cooldown to ensure containers are fully up
     time.sleep(5)
 
     # Check Application Level Health
-    target_url = f"{config.API_URL}/assignments"
-    if not wait_for_http_ready(target_url):
+    if not wait_for_http_ready(ASSIGNMENTS_URL):
         print("[CRITICAL] Cluster unresponsive. Aborting test.")
         return
 
@@ -164,14 +196,23 @@ def test_rolling_update():
     STOP_TRAFFIC = True
     t.join()
 
-    # Calcolo Statistiche
-    total_reqs = len(TRAFFIC_LOG)
-    errors = [x for x in TRAFFIC_LOG if x['status'] != 200]
-    total_errors = len(errors)
+    # Re-stream the log from disk: the generator only kept a small
+    # buffer in memory
+    log = pd.read_csv(CSV_PATH)
+
+    # Calcolo Statistiche (vettoriale: i confronti girano in C, non nel
+    # bytecode Python, anche con decine di migliaia di campioni)
+    ts_arr = log["timestamp"].to_numpy(dtype=np.float64)
+    st_arr = log["status"].to_numpy(dtype=np.int32)
+
+    total_reqs = int(st_arr.size)
+    err_mask = st_arr != 200
+    total_errors = int(err_mask.sum())
 
     # Filtriamo errori avvenuti SOLO durante la finestra reale di aggiornamento
     # Usiamo i tempi assoluti (trigger_time -> update_end_time) per filtrare i log
-    update_errors = [x for x in errors if x['timestamp'] >= trigger_time and x['timestamp'] <= update_end_time]
+    update_mask = err_mask & (ts_arr >= trigger_time) & (ts_arr <= update_end_time)
+    update_errors = int(update_mask.sum())
 
     success_rate = ((total_reqs - total_errors) / total_reqs) * 100 if total_reqs > 0 else 0
 
@@ -185,21 +226,12 @@ def test_rolling_update():
         "total_requests": total_reqs,
         "failed_requests": total_errors,
         "success_rate_percent": round(success_rate, 2),
-        "errors_during_update": len(update_errors)
+        "errors_during_update": update_errors
     }
 
-    # Save CSV Log
-    csv_path = "results/rolling_update_log_nomad.csv"
-    os.makedirs("results", exist_ok=True)
-    with open(csv_path, "w", newline="") as f:
-        writer = csv.DictWriter(f, fieldnames=["timestamp", "status", "error"])
-        writer.writeheader()
-        writer.writerows(TRAFFIC_LOG)
-
     # Save JSON Results
     outfile = "results/rolling_update_nomad.json"
-    with open(outfile, "w") as f:
-        json.dump(output, f, indent=2)
+    save_json(outfile, output)
 
     print(f"\n[TEST] Completed. JSON saved to {outfile}")
 
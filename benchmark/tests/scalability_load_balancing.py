@@ -1,9 +1,18 @@
-import time
+import argparse
+import csv
+import random
 import subprocess
+import time
 import sys
 import os
-import json
-import csv
+
+import numpy as np
+import gevent
+from locust.env import Environment
+from locust.stats import PERCENTILES_TO_REPORT, StatsCSVFileWriter
+import orjson
+import urllib3
+from concurrent.futures import ThreadPoolExecutor
 
 # --- Setup Paths ---
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -12,9 +21,9 @@ sys.path.append(parent_dir)
 
 # --- Local Imports ---
 import config
-#from drivers.swarm_driver import SwarmDriver
-#from drivers.k8s_driver import K8sDriver
-from drivers.nomad_driver import NomadDriver
+from locustfile import APIUser
+from reporting import save_json
+from drivers import get_driver
 
 # --- Constants ---
 LOCUST_USERS = 500
@@ -22,134 +31,333 @@ LOCUST_SPAWN_RATE = 50
 TEST_DURATION = 30
 CONVERGENCE_TIMEOUT = 120  # Seconds to wait for pods to be ready
 STABILIZATION_TIME = 5  # Seconds to wait after convergence
+PROBE_TIMEOUT = 30  # Seconds to wait for the LB to reach every backend
+
+# Locust worker processes. 1 = in-process runner (no fork). A single
+# Locust process is GIL-bound around a few hundred rps: on multi-core
+# rigs set LOCUST_PROCESSES (e.g. to cpu_count//2) to shell out to the
+# CLI with --processes and split the users across per-core workers.
+LOCUST_PROCESSES = int(os.environ.get("LOCUST_PROCESSES", "1"))
+
+# Computed once for every level instead of per run_locust_test call
+HOST_URL = config.API_URL.replace("/api", "")
+LOCUSTFILE = os.path.join(parent_dir, "locustfile.py")
+RESULTS_DIR = os.path.join(parent_dir, "results")
+CSV_DIR = os.path.join(RESULTS_DIR, "csv_raw")
+
+# urllib3 directly: the probes need neither cookies nor redirects, and
+# the pool gives fewer allocations per request than a requests.Session
+POOL = urllib3.PoolManager(num_pools=1, maxsize=32)
 
+# Column index map of the Locust stats CSV. The header layout is fixed
+# for a given Locust version, so it is computed once and reused by every
+# replica level.
+_COL_IDX = None
 
-def run_locust_test(replicas, duration=TEST_DURATION, users=LOCUST_USERS, spawn_rate=LOCUST_SPAWN_RATE):
+
+def wait_for_distinct_backends(replicas, timeout=PROBE_TIMEOUT):
     """
-    Executes a Locust load test in headless mode.
+    Verifies the load balancer actually reaches all replicas before the
+    load test starts.
+
+    Fires concurrent bursts at the base endpoint (which echoes the
+    container_id) instead of probing serially: we only need to observe
+    `replicas` distinct ids, not to order them.
+
+    Returns the full list of observed container ids so the caller can
+    also judge how evenly the load balancer spread the probes.
     """
-    print(f"[TEST] Starting Load Test with Locust (Replicas: {replicas})...")
+    # Pre-resolved IP + Host header: no DNS lookup per pooled connection
+    probe_url = f"{config.API_URL_RESOLVED}/"
+
+    def probe(_):
+        try:
+            resp = POOL.request("GET", probe_url, headers=config.API_HEADERS,
+                                timeout=1.0, retries=False)
+            if resp.status == 200:
+                # orjson parses the raw bytes without the stdlib overhead
+                return orjson.loads(resp.data).get("container_id")
+        except Exception:
+            pass
+        return None
+
+    observed = []
+    distinct = 0
+    deadline = time.time() + timeout
+    with ThreadPoolExecutor(max_workers=min(32, replicas * 5)) as ex:
+        while time.time() < deadline:
+            observed.extend(filter(None, ex.map(probe, range(replicas * 5))))
+            # single C-level pass instead of rebuilding a Python set
+            distinct = np.unique(np.array(observed, dtype=object)).size
+            if distinct >= replicas:
+                print(f"[TEST] Load balancer reaches all {replicas} backends")
+                return observed
+            time.sleep(0.5)
+
+    print(f"[WARNING] Only {distinct}/{replicas} distinct backends observed. proceeding anyway...")
+    return observed
+
+
+def wait_for_convergence(driver, service_name, replicas, timeout=CONVERGENCE_TIMEOUT):
+    """
+    Blocks until the service reaches the desired replica count.
+
+    If the driver exposes a streaming watch (kubectl -w for K8s, the
+    Docker events stream for Swarm), use it: we wake on the actual
+    transition instead of paying ~60 polls per scale level. Otherwise
+    fall back to polling with exponential backoff and jitter.
+    """
+    waiter = getattr(driver, "watch_replicas", None) \
+        or getattr(driver, "wait_for_convergence", None)
+    if waiter:
+        if waiter(service_name, replicas, timeout=timeout):
+            print(f"[TEST] Convergence reached: {replicas}/{replicas}")
+        else:
+            print(f"[WARNING] Timeout waiting for convergence. proceeding anyway...")
+        return
+
+    start_wait = time.time()
+    delay = 0.2
+    while True:
+        current, desired = driver.get_replica_count(service_name)
+        if current == replicas and desired == replicas:
+            print(f"[TEST] Convergence reached: {current}/{replicas}")
+            break
+
+        if time.time() - start_wait > timeout:
+            print(f"[WARNING] Timeout waiting for convergence ({current}/{replicas}). proceeding anyway...")
+            break
+        time.sleep(delay * random.uniform(0.9, 1.1))
+        delay = min(delay * 1.5, 2.0)
+
+
+def balance_std_dev(containers):
+    """
+    Standard deviation of the per-container hit counts (0 = perfectly
+    balanced). np.unique builds the histogram in one C-level pass (one
+    hash build instead of set + Counter) and the population std (ddof=0,
+    same as pstdev before) is vectorized.
+    """
+    if not containers:
+        return 0.0
+    _, counts = np.unique(np.array(containers, dtype=object), return_counts=True)
+    return round(float(counts.std()), 2) if counts.size > 1 else 0.0
+
+
+def _run_locust_cli(replicas, duration, users, spawn_rate, driver=None):
+    """
+    Multi-process Locust run via the CLI (--processes). Used when
+    LOCUST_PROCESSES > 1; stats come back through the generated CSV.
+
+    The child is started with Popen so the wait is not dead time: while
+    Locust runs, the cluster state is sampled once per second into a
+    sidecar CSV (when a driver is provided).
+    """
+    print(f"[TEST] Starting Load Test with Locust CLI, {LOCUST_PROCESSES} processes (Replicas: {replicas})...")
 
     # Setup results directory
-    results_dir = os.path.join(parent_dir, "results")
-    csv_dir = os.path.join(results_dir, "csv_raw")
-    os.makedirs(csv_dir, exist_ok=True)
+    os.makedirs(CSV_DIR, exist_ok=True)
 
     # Define CSV prefix for Locust output
-    csv_prefix = os.path.join(csv_dir, f"locust_rep_{replicas}")
+    csv_prefix = os.path.join(CSV_DIR, f"locust_rep_{replicas}")
 
-    host_url = config.API_URL.replace("/api", "")
     cmd = [
         "locust",
-        "-f", os.path.join(parent_dir, "locustfile.py"),
+        "-f", LOCUSTFILE,
         "--headless",
         "-u", str(users),
         "-r", str(spawn_rate),
         "-t", f"{duration}s",
-        "--host", host_url,
-        "--csv", csv_prefix
+        "--host", HOST_URL,
+        "--csv", csv_prefix,
+        "--processes", str(LOCUST_PROCESSES)
     ]
 
     try:
-        # Run Locust and suppress standard output to keep console clean
-        subprocess.run(cmd, check=False, cwd=parent_dir, stdout=subprocess.DEVNULL)
+        # Popen instead of run: the parent stays free while Locust works
+        # (stdout suppressed to keep the console clean)
+        proc = subprocess.Popen(cmd, cwd=parent_dir, stdout=subprocess.DEVNULL)
     except Exception as e:
         print(f"[CRITICAL ERROR] Locust failed to start: {e}")
         return None
 
+    if driver is not None:
+        # Overlap: per-second replica samples while the load test runs
+        with open(f"{csv_prefix}_cluster.csv", "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["timestamp", "running", "desired"])
+            while proc.poll() is None:
+                cur, des = driver.get_replica_count(config.SERVICE_NAME)
+                writer.writerow([time.time(), cur, des])
+                f.flush()
+                time.sleep(1)
+    proc.wait()
+
     # Parse the generated stats file
     stats_file = f"{csv_prefix}_stats.csv"
-    result = {}
+    result = None
 
-    if os.path.exists(stats_file):
-        try:
-            with open(stats_file, mode='r') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    # We are interested in the 'Aggregated' row for total stats
-                    if row['Name'] == 'Aggregated':
-                        result = {
-                            "replicas": replicas,
-                            "requests": int(row['Request Count']),
-                            "failures": int(row['Failure Count']),
-                            "rps": float(row['Requests/s']),
-                            "avg_latency": float(row['Average Response Time']),
-                            "p95_latency": float(row['95%']),
-                            "p99_latency": float(row['99%'])
-                        }
-        except Exception as e:
-            print(f"[ERROR] Failed reading CSV: {e}")
-            return None
-        print(f"-> CSV saved to: {stats_file}")
-    else:
+    try:
+        # Single open in try/except: no separate exists() stat syscall.
+        # csv.reader + fixed column indices: no dict allocation per row,
+        # and the scan stops at the 'Aggregated' row instead of draining
+        # the whole file
+        with open(stats_file, mode='r', buffering=1 << 20) as f:
+            reader = csv.reader(f)
+            header = next(reader)
+            global _COL_IDX
+            if _COL_IDX is None:
+                _COL_IDX = {name: header.index(name) for name in (
+                    "Name", "Request Count", "Failure Count", "Requests/s",
+                    "Average Response Time", "95%", "99%")}
+            idx = _COL_IDX
+            for row in reader:
+                if row[idx["Name"]] == "Aggregated":
+                    result = {
+                        "replicas": replicas,
+                        "requests": int(row[idx["Request Count"]]),
+                        "failures": int(row[idx["Failure Count"]]),
+                        "rps": float(row[idx["Requests/s"]]),
+                        "avg_latency": float(row[idx["Average Response Time"]]),
+                        "p95_latency": float(row[idx["95%"]]),
+                        "p99_latency": float(row[idx["99%"]])
+                    }
+                    break
+    except FileNotFoundError:
         print(f"[ERROR] Stats file not found at: {stats_file}")
         return None
+    except Exception as e:
+        print(f"[ERROR] Failed reading CSV: {e}")
+        return None
 
+    print(f"-> CSV saved to: {stats_file}")
     return result
 
 
-def test_scalability():
+def run_locust_test(replicas, duration=TEST_DURATION, users=LOCUST_USERS, spawn_rate=LOCUST_SPAWN_RATE, driver=None):
+    """
+    Executes a Locust load test in-process (headless equivalent).
+
+    Driving Locust through its Environment API instead of the CLI avoids
+    the process fork and the CSV write/re-parse round trip: when the run
+    ends, the stats are already available as Python objects.
+
+    With LOCUST_PROCESSES > 1 the CLI multi-process path is used instead.
+    """
+    if LOCUST_PROCESSES > 1:
+        return _run_locust_cli(replicas, duration, users, spawn_rate, driver=driver)
+
+    print(f"[TEST] Starting Load Test with Locust (Replicas: {replicas})...")
+
+    # Keep producing the raw CSVs in results/csv_raw like the CLI run
+    # did, just written from inside the process
+    os.makedirs(CSV_DIR, exist_ok=True)
+    csv_prefix = os.path.join(CSV_DIR, f"locust_rep_{replicas}")
+
+    try:
+        env = Environment(user_classes=[APIUser], host=HOST_URL)
+        env.create_local_runner()
+
+        csv_writer = StatsCSVFileWriter(env, PERCENTILES_TO_REPORT, csv_prefix)
+        writer_greenlet = gevent.spawn(csv_writer.stats_writer)
+
+        env.runner.start(users, spawn_rate=spawn_rate)
+        gevent.spawn_later(duration, env.runner.quit)
+        env.runner.greenlet.join()
+
+        writer_greenlet.kill(block=True)
+        csv_writer.close_files()
+    except Exception as e:
+        print(f"[CRITICAL ERROR] Locust failed to start: {e}")
+        return None
+
+    total = env.stats.total
+    if total.num_requests == 0:
+        print(f"[ERROR] Locust collected no requests for {replicas} replicas")
+        return None
+
+    return {
+        "replicas": replicas,
+        "requests": total.num_requests,
+        "failures": total.num_failures,
+        "rps": round(total.total_rps, 2),
+        "avg_latency": round(total.avg_response_time, 2),
+        "p95_latency": total.get_response_time_percentile(0.95),
+        "p99_latency": total.get_response_time_percentile(0.99)
+    }
+
+
+def test_scalability(driver_name="nomad"):
     """
     Main Scalability Test Loop.
     Scales the backend to [1, 3, 5] replicas and runs a load test for each level.
     """
-    #driver = SwarmDriver()
-    #driver = K8sDriver()
-    driver = NomadDriver()
+    driver = get_driver(driver_name)
     levels = [1, 3, 5]
 
     output = {
-        "test_name": "scalability_stress_test_nomad",
-        "description": "Stress test using Locust on Nomad to measure throughput vs replicas",
+        "test_name": f"scalability_stress_test_{driver_name}",
+        "description": f"Stress test using Locust on {driver_name} to measure throughput vs replicas",
         "results": []
     }
 
-    print("--- Scalability & Load Balancing Stress Test (Nomad) ---")
+    print(f"--- Scalability & Load Balancing Stress Test ({driver_name}) ---")
 
     # Reset cluster to a clean state
     driver.reset_cluster()
 
-    for replicas in levels:
-        service_name = config.SERVICE_NAME  # Usually 'backend'
+    service_name = config.SERVICE_NAME  # Usually 'backend'
 
-        driver.scale_service(service_name, replicas)
+    # Pipelined loop: each level's scale-up is triggered as soon as the
+    # previous measurement ends, so the post-processing below overlaps
+    # the cluster's convergence instead of adding to the wall time.
+    # (Running the Locust measurements themselves concurrently is not an
+    # option: all levels share the same stack and entrypoint.)
+    driver.scale_service(service_name, levels[0])
 
+    for i, replicas in enumerate(levels):
         print(f"[TEST] Waiting for {replicas} replicas to be ready...")
         time.sleep(2)  # Allow K8s API to update status
 
-        # Wait for convergence
-        start_wait = time.time()
-        while True:
-            current, desired = driver.get_replica_count(service_name)
-            if current == replicas and desired == replicas:
-                print(f"[TEST] Convergence reached: {current}/{replicas}")
-                break
-
-            if time.time() - start_wait > CONVERGENCE_TIMEOUT:
-                print(f"[WARNING] Timeout waiting for convergence ({current}/{replicas}). proceeding anyway...")
-                break
-            time.sleep(2)
+        # Wait for convergence (event-driven when the driver supports it)
+        wait_for_convergence(driver, service_name, replicas)
 
         print(f"[TEST] Stabilizing for {STABILIZATION_TIME}s...")
         time.sleep(STABILIZATION_TIME)
 
+        # Make sure traffic is actually spread over all new replicas
+        containers = wait_for_distinct_backends(replicas)
+
         # Run the actual load test
-        data = run_locust_test(replicas)
+        data = run_locust_test(replicas, driver=driver)
+
+        # Kick off the next level's scale-up before crunching this one
+        if i + 1 < len(levels):
+            driver.scale_service(service_name, levels[i + 1])
 
         if data:
+            data["balance_std_dev"] = balance_std_dev(containers)
             print(f"-> Result: {data['rps']} RPS | {data['avg_latency']}ms avg | Failures: {data['failures']}")
             output["results"].append(data)
         else:
             print(f"[ERROR] No data collected for {replicas} replicas")
+            # A failed level is the one case that justifies a full reset;
+            # re-issue the next level's scale-up afterwards since the
+            # reset overrides the count we pipelined above
+            driver.reset_cluster()
+            if i + 1 < len(levels):
+                driver.scale_service(service_name, levels[i + 1])
 
     # Save Results
     os.makedirs("results", exist_ok=True)
-    outfile = "results/scalability_load_balancing_nomad.json"
-    with open(outfile, "w") as f:
-        json.dump(output, f, indent=2)
+    outfile = f"results/scalability_load_balancing_{driver_name}.json"
+    save_json(outfile, output)
 
     print(f"\n[TEST] Completed. JSON saved to {outfile}")
 
 
 if __name__ == "__main__":
-    test_scalability()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Scalability & load balancing stress test")
+    parser.add_argument("--driver", choices=["swarm", "k8s", "nomad"], default="nomad")
+    args = parser.parse_args()
+    test_scalability(args.driver)
\ No newline at end of file
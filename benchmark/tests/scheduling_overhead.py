@@ -1,7 +1,8 @@
+import argparse
+import threading
 import time
 import sys
 import os
-import json
 
 # Setup path
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -10,8 +11,8 @@ sys.path.append(parent_dir)
 
 # Local imports
 import config
-# from drivers.k8s_driver import K8sDriver
-from drivers.nomad_driver import NomadDriver  # <--- USIAMO NOMAD
+from reporting import save_json
+from drivers import get_driver
 
 DUMMY_SERVICE_NAME = "benchmark-dummy"
 # Livelli di carico: 10, 50, 100 container
@@ -20,16 +21,16 @@ LEVELS = [10, 50, 100]
 TIMEOUT_SECONDS = 120
 
 
-def test_scheduling():
-    driver = NomadDriver()
+def test_scheduling(driver_name="nomad"):
+    driver = get_driver(driver_name)
 
     output = {
-        "test_name": "scheduling_overhead_burst_nomad",
-        "description": "Time to schedule N lightweight containers (Alpine) on Nomad",
+        "test_name": f"scheduling_overhead_burst_{driver_name}",
+        "description": f"Time to schedule N lightweight containers (Alpine) on {driver_name}",
         "results": []
     }
 
-    print("--- Scheduling Overhead Test (Burst - Nomad) ---")
+    print(f"--- Scheduling Overhead Test (Burst - {driver_name}) ---")
 
     # Clean start
     driver.remove_service(DUMMY_SERVICE_NAME)
@@ -37,44 +38,66 @@ def test_scheduling():
     # --- WARMUP ---
     # Nomad è velocissimo a schedulare, ma se deve scaricare l'immagine docker (pull)
     # il test viene falsato dalla rete. Facciamo un giro a vuoto.
-    print("[TEST] Warming up (Pulling Alpine image on nodes)...")
-    driver.create_dummy_service(DUMMY_SERVICE_NAME, 3)  # 3 repliche (una per nodo)
-    time.sleep(5)
-    driver.remove_service(DUMMY_SERVICE_NAME)
+    print("[TEST] Warming up (Pulling Alpine image on ALL nodes)...")
+    if hasattr(driver, "prewarm_image"):
+        # Job system / servizio global: un'allocazione per nodo garantita,
+        # a differenza delle 3 repliche che lo scheduler può impacchettare
+        # su meno nodi lasciando cache vuote
+        prewarm_name = driver.prewarm_image("alpine:latest")
+        time.sleep(5)
+        driver.remove_service(prewarm_name)
+    else:
+        driver.create_dummy_service(DUMMY_SERVICE_NAME, 3)  # 3 repliche (una per nodo)
+        time.sleep(5)
+        driver.remove_service(DUMMY_SERVICE_NAME)
     time.sleep(2)
     # --------------
 
     for target in LEVELS:
         print(f"\n[TEST] Testing burst of {target} containers...")
 
-        # Start Timer
-        start_time = time.time()
+        # Start Timer (contatore monotono in ns: niente salti NTP
+        # dentro una misura di durata)
+        start_ns = time.perf_counter_ns()
 
         # Inviamo il Job al cluster
         driver.create_dummy_service(DUMMY_SERVICE_NAME, target)
 
-        # Polling for 'Running'
-        # Nomad aggiorna lo stato molto velocemente
-        while True:
-            running = driver.count_running_tasks(DUMMY_SERVICE_NAME)
-
-            sys.stdout.write(f"\r[POLLING] Active: {running}/{target}")
-            sys.stdout.flush()
-
-            if running >= target:
-                end_time = time.time()
-                print("")
-                break
-
-            # Timeout sicurezza
-            if time.time() - start_time > TIMEOUT_SECONDS:
-                print(f"\n[WARNING] Timeout reached! Only {running}/{target} started.")
-                end_time = time.time()
-                break
-
-            time.sleep(0.1)  # Polling veloce per Nomad
-
-        duration = end_time - start_time
+        # Attesa event-driven: lo stream di eventi Nomad ci sveglia sulle
+        # transizioni delle allocazioni invece di 1200 poll da 100ms
+        if hasattr(driver, "wait_for_running_allocations"):
+            running = driver.wait_for_running_allocations(DUMMY_SERVICE_NAME, target,
+                                                          timeout=TIMEOUT_SECONDS)
+            end_ns = time.perf_counter_ns()
+            if running < target:
+                print(f"[WARNING] Timeout reached! Only {running}/{target} started.")
+        else:
+            # Fallback: polling for 'Running'
+            last_running = -1
+            while True:
+                running = driver.count_running_tasks(DUMMY_SERVICE_NAME)
+
+                # Display aggiornato solo al cambio di stato: ~30 write
+                # invece di 1200 flush sul tty durante il burst
+                if running != last_running:
+                    sys.stdout.write(f"\r[POLLING] Active: {running}/{target}")
+                    sys.stdout.flush()
+                    last_running = running
+
+                if running >= target:
+                    end_ns = time.perf_counter_ns()
+                    print("")
+                    break
+
+                # Timeout sicurezza
+                if time.perf_counter_ns() - start_ns > TIMEOUT_SECONDS * 1_000_000_000:
+                    print(f"\n[WARNING] Timeout reached! Only {running}/{target} started.")
+                    end_ns = time.perf_counter_ns()
+                    break
+
+                time.sleep(0.1)  # Polling veloce per Nomad
+
+        duration = (end_ns - start_ns) / 1e9
         rate = target / duration if duration > 0 else 0
 
         print(f"\n-> Result: {target} containers in {duration:.3f}s")
@@ -87,19 +110,24 @@ def test_scheduling():
             "containers_per_second": round(rate, 2)
         })
 
-        # Cleanup immediato per il prossimo giro
-        driver.remove_service(DUMMY_SERVICE_NAME)
+        # Cleanup sovrapposto al cool-down: il purge del job non deve
+        # serializzare con l'attesa, sono entrambi tempi morti
+        cleanup = threading.Thread(target=driver.remove_service, args=(DUMMY_SERVICE_NAME,))
+        cleanup.start()
 
         print("[TEST] Cooling down (5s)...")
         time.sleep(5)
+        cleanup.join()
 
     # Save res
     os.makedirs("results", exist_ok=True)
-    outfile = "results/scheduling_overhead_nomad.json"
-    with open(outfile, "w") as f:
-        json.dump(output, f, indent=2)
+    outfile = f"results/scheduling_overhead_{driver_name}.json"
+    save_json(outfile, output)
     print(f"\n[TEST] Completed. JSON saved to {outfile}")
 
 
 if __name__ == "__main__":
-    test_scheduling()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Burst scheduling overhead test")
+    parser.add_argument("--driver", choices=["swarm", "k8s", "nomad"], default="nomad")
+    args = parser.parse_args()
+    test_scheduling(args.driver)
\ No newline at end of file
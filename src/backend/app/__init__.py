@@ -1,16 +1,34 @@
 import os
 import socket
-from flask import Flask, send_from_directory
+import orjson
+from flask import Flask, jsonify, request, send_from_directory
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 from .services import mongodb
 from .routes import assignments
 from .routes import submissions
 
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    flask.json provider backed by orjson: jsonify and the error paths
+    encode in native code instead of the stdlib encoder.
+    """
+    def dumps(self, obj, **kwargs):
+        # default=str covers ObjectId and friends; datetimes are native
+        return orjson.dumps(obj, default=str,
+                            option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+
 def create_app():
     """
     Flask app factory, create application
     """
     app = Flask(__name__)
+    app.json = OrjsonProvider(app)
     CORS(app)
 
     mongo_uri = os.environ.get('MONGO_URI')
@@ -20,6 +38,15 @@ def create_app():
     except Exception as e:
         print(f"MongoDB connection error: {e}")
 
+        # One-time gate instead of re-reading the collection globals on
+        # every request: they only become usable again after a process
+        # restart, so the check is paid at factory time, not per call
+        @app.before_request
+        def db_unavailable():
+            if request.path == '/':
+                return None  # the base endpoint reports DB status itself
+            return jsonify({"error": "Database not connected"}), 500
+
     app.register_blueprint(assignments.assignments_bp)
     app.register_blueprint(submissions.submissions_bp)
 
@@ -0,0 +1,45 @@
+import orjson
+from bson import ObjectId
+from bson.errors import InvalidId
+from flask import Response
+
+
+def to_object_id(value):
+    """
+    Parses `value` into an ObjectId, or None if it is not a valid id.
+    ObjectId.__init__ already validates fully, so this is one pass over
+    the string instead of the is_valid + constructor double parse.
+    """
+    # ObjectId(None) would mint a brand new id instead of failing
+    if value is None:
+        return None
+    try:
+        return ObjectId(value)
+    except (InvalidId, TypeError):
+        return None
+
+
+def stream_json_response(cursor):
+    """
+    Streams a pymongo cursor as a JSON array response.
+
+    The generator yields one document at a time (with 500-document
+    driver batches), so the worker never materializes the whole result
+    set and the first bytes leave as soon as the first batch arrives.
+
+    Documents are encoded with orjson in the shape the frontend already
+    consumes: _id as a plain hex string and datetimes as ISO-8601 - not
+    the {"$oid"}/{"$date"} extended-JSON wrappers.
+    """
+    def generate():
+        yield b"["
+        first = True
+        for doc in cursor.batch_size(500):
+            doc['_id'] = str(doc['_id'])
+            prefix = b"" if first else b","
+            first = False
+            # default=str covers any remaining BSON type (ObjectId refs)
+            yield prefix + orjson.dumps(doc, default=str)
+        yield b"]"
+
+    return Response(generate(), mimetype="application/json")
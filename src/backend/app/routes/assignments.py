@@ -1,15 +1,13 @@
-import datetime
-from flask import Blueprint, request, Response, jsonify
+from datetime import datetime, timezone
+from flask import Blueprint, request, jsonify
+from . import stream_json_response, to_object_id
 from ..services import mongodb
-from bson import ObjectId
 
 assignments_bp = Blueprint('assignments_bp', __name__, url_prefix='/assignments')
 
-@assignments_bp.before_request
-def check_db_connection():
-    if mongodb.assignments_collection is None or mongodb.submissions_collection is None:
-        return jsonify({"error": "Database not connected"}), 500
-    return None
+# The database-availability gate lives in create_app: it is registered
+# only when init_db failed, instead of re-checking the collection
+# globals on every request.
 
 @assignments_bp.route('', methods=['POST'])
 def create_assignment():
@@ -22,7 +20,7 @@ def create_assignment():
         "title": data.get('title'),
         "description": data.get('description', ''),
         "due_date": data.get('due_date'),
-        "created_at": datetime.datetime.now(datetime.timezone.utc)
+        "created_at": datetime.now(timezone.utc)
     }
 
     result = mongodb.assignments_collection.insert_one(new_assignment)
@@ -33,13 +31,30 @@ def create_assignment():
 
 @assignments_bp.route('', methods=['GET'])
 def get_all_assignments():
-    """Retrieves all existing assignments"""
+    """Retrieves all existing assignments (paginated)"""
     try:
-        assignments = list(mongodb.assignments_collection.find({}))
-        for assignment in assignments:
-            assignment['_id'] = str(assignment['_id'])
-
-        return jsonify(assignments)
+        # Server-side pagination: never drain the whole collection for a
+        # single response. ?limit= (default 100, cap 1000) and ?skip=.
+        try:
+            # clamp below as well: limit(0) would mean 'no limit' to
+            # pymongo and negatives apply their absolute value
+            limit = min(max(int(request.args.get('limit', 100)), 1), 1000)
+            skip = max(int(request.args.get('skip', 0)), 0)
+        except ValueError:
+            return jsonify({"error": "limit/skip must be integers"}), 400
+
+        # No projection here: the student view renders description on
+        # every assignment card, so the listing needs the full document.
+        # Due-date order (served by the due_date index) is the natural
+        # way to show assignments and keeps the pagination deterministic.
+        cursor = (mongodb.assignments_collection
+                  .find({})
+                  .sort("due_date", 1)
+                  .skip(skip)
+                  .limit(limit))
+        # Chunked streaming: constant memory and first bytes out after
+        # the first driver batch instead of the full query
+        return stream_json_response(cursor)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -48,13 +63,16 @@ def get_all_assignments():
 def get_assignment_by_id(assignment_id):
     """Return a single assignment by its ID"""
     try:
-        if not ObjectId.is_valid(assignment_id):
+        oid = to_object_id(assignment_id)
+        if oid is None:
             return jsonify({"error": "ID assignment not valid"}), 400
 
-        assignment = mongodb.assignments_collection.find_one({"_id": ObjectId(assignment_id)})
+        assignment = mongodb.assignments_collection.find_one({"_id": oid})
         if not assignment:
             return jsonify({"error": "Assignment not found"}), 404
 
+        # jsonify goes through the orjson provider, which flattens the
+        # ObjectId to the hex string the frontend expects
         assignment['_id'] = str(assignment['_id'])
         return jsonify(assignment)
 
@@ -65,10 +83,14 @@ def get_assignment_by_id(assignment_id):
 def create_submission(assignment_id):
     """ Creates a new submission"""
     try:
-        if not ObjectId.is_valid(assignment_id):
+        oid = to_object_id(assignment_id)
+        if oid is None:
             return jsonify({"error": "ID assignment non valido nell'URL"}), 400
 
-        if mongodb.assignments_collection.count_documents({"_id": ObjectId(assignment_id)}) == 0:
+        # find_one with an _id-only projection: a point lookup instead of
+        # the aggregation path count_documents goes through
+        if mongodb.assignments_collection.find_one({"_id": oid},
+                                                   projection={"_id": True}) is None:
             return jsonify({"error": "Assignment not found"}), 404
 
         data = request.json
@@ -78,7 +100,7 @@ def create_submission(assignment_id):
         new_submission = {
             "idAssignment": assignment_id,
             "student_name": data['student_name'],
-            "submitted_at": datetime.datetime.now(datetime.timezone.utc),
+            "submitted_at": datetime.now(timezone.utc),
             "result": data['result']
         }
 
@@ -1,23 +1,49 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, jsonify, request
+from . import stream_json_response, to_object_id
 from ..services import mongodb
-from bson import ObjectId
 
 submissions_bp = Blueprint('submissions_bp', __name__, url_prefix='/submissions')
 
-@submissions_bp.before_request
-def check_db_connection():
-    if mongodb.submissions_collection is None:
-        return jsonify({"error": "Database not connected"}), 500
+# The database-availability gate lives in create_app: it is registered
+# only when init_db failed, instead of re-checking the collection
+# globals on every request.
 
 @submissions_bp.route('', methods=['GET'])
 def get_all_submissions():
-    """Retrieve all submissions"""
+    """Retrieve all submissions (paginated)"""
     try:
-        submissions = list(mongodb.submissions_collection.find())
-        for sub in submissions:
-            sub['_id'] = str(sub['_id'])
+        # Server-side pagination: never drain the whole collection for a
+        # single response. ?limit= (default 100, cap 1000) and ?skip=.
+        try:
+            # clamp below as well: limit(0) would mean 'no limit' to
+            # pymongo and negatives apply their absolute value
+            limit = min(max(int(request.args.get('limit', 100)), 1), 1000)
+            skip = max(int(request.args.get('skip', 0)), 0)
+        except ValueError:
+            return jsonify({"error": "limit/skip must be integers"}), 400
 
-        return jsonify(submissions)
+        # Optional ?assignment= filter; with it the compound
+        # (idAssignment, submitted_at) index serves filter + sort,
+        # without it the submitted_at index serves the sort alone
+        query = {}
+        assignment_id = request.args.get('assignment')
+        if assignment_id is not None:
+            query["idAssignment"] = assignment_id
+
+        # Project to the fields the professor view's table renders
+        # (including result - it shows in the grades column).
+        # Newest-first sort also keeps the pagination deterministic.
+        cursor = (mongodb.submissions_collection
+                  .find(query, projection={"student_name": True,
+                                           "idAssignment": True,
+                                           "submitted_at": True,
+                                           "result": True})
+                  .sort("submitted_at", -1)
+                  .skip(skip)
+                  .limit(limit))
+        # Chunked streaming: constant memory and first bytes out after
+        # the first driver batch instead of the full query
+        return stream_json_response(cursor)
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -25,16 +51,18 @@ def get_all_submissions():
 def get_submission(submission_id):
     """Retrieve details of a specific submission"""
     try:
-        if not ObjectId.is_valid(submission_id):
+        oid = to_object_id(submission_id)
+        if oid is None:
             return jsonify({"error": "Submission ID not valid"}), 400
 
-        submission = mongodb.submissions_collection.find_one({"_id": ObjectId(submission_id)})
+        submission = mongodb.submissions_collection.find_one({"_id": oid})
 
         if not submission:
             return jsonify({"error": "Submission not found"}), 404
 
+        # jsonify goes through the orjson provider, which flattens the
+        # ObjectId to the hex string the frontend expects
         submission['_id'] = str(submission['_id'])
-
         return jsonify(submission)
 
     except Exception as e:
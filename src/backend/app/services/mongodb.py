@@ -1,4 +1,4 @@
-from pymongo import MongoClient
+from pymongo import IndexModel, MongoClient
 from pymongo.errors import ConnectionFailure
 
 #global variables
@@ -18,7 +18,9 @@ def init_db(mongo_uri):
         print("Error: mongo_uri not setted")
         raise ValueError("MONGO_URI not setted")
 
-    client = MongoClient(mongo_uri, serverSelectionTimeoutMS=5000)
+    # maxPoolSize sized for the gevent workers: many greenlets share
+    # this one client, each DB call borrowing a pooled socket
+    client = MongoClient(mongo_uri, serverSelectionTimeoutMS=5000, maxPoolSize=100)
     #try to ping
     client.admin.command('ping')
 
@@ -26,6 +28,26 @@ def init_db(mongo_uri):
     assignments_collection = db.assignments
     submissions_collection = db.submissions
 
+    ensure_indexes()
+
+
+def ensure_indexes():
+    """
+    Declares the indexes for the queries the routes run: the submissions
+    listing sorts on submitted_at (optionally filtered by assignment,
+    served by the compound index) and the assignments listing sorts on
+    due_date. Batched in a single createIndexes command per collection;
+    background builds so a restart against a populated DB doesn't block
+    serving.
+    """
+    submissions_collection.create_indexes([
+        IndexModel([("idAssignment", 1), ("submitted_at", -1)], background=True),
+        IndexModel([("submitted_at", -1)], background=True)
+    ])
+    assignments_collection.create_indexes([
+        IndexModel([("due_date", 1)], background=True)
+    ])
+
 
 def check_db_connection():
     """